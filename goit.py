@@ -2,6 +2,8 @@
 
 # stdlib imports
 import os
+import sys
+import argparse
 
 # internal imports
 from goitlib import *
@@ -10,7 +12,23 @@ from goitlib import *
 config_dir = os.path.join(os.getenv("HOME"), ".config", "goit")
 
 
+def sync(argv):
+    parser = argparse.ArgumentParser(
+        prog="goit sync",
+        description="Refresh cached data for your most used repos (e.g. from cron).",
+    )
+    parser.add_argument("-n", "--top", type=int, default=10, help="repos to warm")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="parallel fetches")
+    args = parser.parse_args(argv)
+
+    for owner, repo, name in warm(get_backend(), args.top, args.jobs):
+        print(f"{owner}/{repo} {name}")
+
+
 def main():
+    if sys.argv[1:2] == ["sync"]:
+        return sync(sys.argv[2:])
+
     app = AppSetup()
     app.run()
 
@@ -1,4 +1,8 @@
 # internal imports
 from .ui import *
 from .edict import *
+from .rowstore import *
 from .ghcli import *
+from .ghapi import *
+from .warmer import *
+from .diffview import *
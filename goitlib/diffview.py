@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+# stdlib imports
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+# 3rd party imports
+from rich.text import Text
+from rich.style import Style
+from rich.syntax import Syntax
+from textual.geometry import Size
+from textual.screen import Screen
+from textual.strip import Strip
+from textual.scroll_view import ScrollView
+from textual.widgets import Footer, Label, ListItem, ListView
+from textual.worker import get_current_worker
+
+block_size = 256  # most lines highlighted in one go
+block_cache_size = 64  # highlighted blocks kept around
+
+
+class DiffIndex:
+    """
+    Raw diff lines plus the offsets where each file and hunk starts, built
+    up as lines arrive. Only plain strings are kept; styling happens later,
+    a block at a time, for what is on screen.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.files = []  # [(path, first line)]
+        self.file_starts = []
+        self.hunks = []  # first line of every hunk body
+        self.hunk_files = []  # index into files for each hunk
+        self.width = 0
+
+    def feed(self, line):
+        n = len(self.lines)
+        line = line.expandtabs(4)
+        if line.startswith("diff --git "):
+            self.files.append((line.rsplit(" b/", 1)[-1], n))
+            self.file_starts.append(n)
+        elif line.startswith("@@") and self.files:
+            self.hunks.append(n + 1)
+            self.hunk_files.append(len(self.files) - 1)
+        self.lines.append(line)
+        self.width = max(self.width, len(line))
+
+    def block_of(self, y):
+        """(start, stop, file) of the highlight block holding line y, or None."""
+        h = bisect_right(self.hunks, y) - 1
+        f = bisect_right(self.file_starts, y) - 1
+        # Lines before a file's first hunk are headers, not code
+        if h < 0 or self.hunk_files[h] != f:
+            return None
+        start = self.hunks[h]
+        stop = self.hunks[h + 1] - 1 if h + 1 < len(self.hunks) else len(self.lines)
+        if f + 1 < len(self.file_starts):
+            stop = min(stop, self.file_starts[f + 1])
+        # Nor is the next hunk's header
+        if y >= stop:
+            return None
+        start += (y - start) // block_size * block_size
+        return (start, min(stop, start + block_size), self.files[f][0])
+
+
+class DiffView(ScrollView):
+    """Line API view over a DiffIndex, highlighting blocks on demand."""
+
+    def __init__(self, index, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        self._blocks = OrderedDict()
+        self._lexers = {}
+
+    def grow(self):
+        self.virtual_size = Size(self.index.width + 2, len(self.index.lines))
+        self.refresh()
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        y += scroll_y
+        width = self.size.width
+        if y >= len(self.index.lines):
+            return Strip.blank(width, self.rich_style)
+
+        line = self.index.lines[y]
+        block = self.index.block_of(y)
+        if block and line[:1] in ("+", "-", " ", ""):
+            text = self._highlight(*block)[y - block[0]]
+        elif line.startswith("@@"):
+            text = Text(line, style="cyan")
+        elif line.startswith(("diff --git", "index ", "--- ", "+++ ")):
+            text = Text(line, style="bold")
+        else:
+            text = Text(line, style="dim")
+
+        strip = Strip(text.render(self.app.console), text.cell_len)
+        return strip.crop_extend(scroll_x, scroll_x + width, self.rich_style)
+
+    def _highlight(self, start, stop, path):
+        key = (start, stop)
+        if key in self._blocks:
+            self._blocks.move_to_end(key)
+            return self._blocks[key]
+
+        lines = self.index.lines[start:stop]
+        if path not in self._lexers:
+            self._lexers[path] = Syntax.guess_lexer(path)
+        syntax = Syntax("", self._lexers[path], theme="monokai")
+        code = syntax.highlight("\n".join(l[1:] for l in lines))
+
+        retv = []
+        for line, hl in zip(lines, code.split("\n", allow_blank=True)):
+            mark = line[:1]
+            if mark == "+":
+                hl.stylize_before(Style(bgcolor="#12361b"))
+                prefix = Text("+", style="bold green")
+            elif mark == "-":
+                hl.stylize_before(Style(bgcolor="#3d1316"))
+                prefix = Text("-", style="bold red")
+            else:
+                prefix = Text(" ")
+            retv.append(Text.assemble(prefix, hl))
+
+        self._blocks[key] = retv
+        if len(self._blocks) > block_cache_size:
+            self._blocks.popitem(last=False)
+        return retv
+
+
+class DiffScreen(Screen):
+    """Streams a pull request diff, with a file list for jumping around."""
+
+    BINDINGS = [("escape", "app.pop_screen", "back")]
+    CSS = """
+DiffScreen { layout: horizontal; }
+#diff_files { width: 30%; height: 100%; border: round grey; }
+#diff_view { width: 1fr; height: 100%; border: round grey; }
+"""
+
+    def __init__(self, dp, owner, repo, number):
+        super().__init__()
+        self.dp = dp
+        self.owner = owner
+        self.repo = repo
+        self.number = number
+        self.index = DiffIndex()
+
+    def compose(self):
+        files = ListView(id="diff_files")
+        files.border_title = "Files"
+        yield files
+        view = DiffView(self.index, id="diff_view")
+        view.border_title = f"{self.owner}/{self.repo} #{self.number}"
+        yield view
+        yield Footer()
+
+    def on_mount(self):
+        self.run_worker(self.stream, thread=True, exclusive=True)
+
+    def stream(self):
+        worker = get_current_worker()
+        shown = 0
+        last = time.monotonic()
+        lines = self.dp.stream_diff(self.owner, self.repo, self.number)
+        try:
+            for line in lines:
+                if worker.is_cancelled:
+                    return
+                self.index.feed(line)
+                # Push what we have to the screen a few times a second
+                if time.monotonic() - last > 0.2:
+                    shown = self.app.call_from_thread(self.show_progress, shown)
+                    last = time.monotonic()
+        except ValueError as e:
+            self.app.call_from_thread(self.notify, str(e), severity="error")
+        finally:
+            lines.close()
+        self.app.call_from_thread(self.show_progress, shown)
+
+    def show_progress(self, shown):
+        files = self.query_one("#diff_files", ListView)
+        for path, _ in self.index.files[shown:]:
+            files.append(ListItem(Label(path)))
+        self.query_one("#diff_view", DiffView).grow()
+        return len(self.index.files)
+
+    def on_list_view_selected(self, event):
+        start = self.index.files[event.list_view.index][1]
+        self.query_one("#diff_view", DiffView).scroll_to(y=start, animate=False)
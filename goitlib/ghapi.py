@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+
+# stdlib imports
+import os
+import json
+import queue
+import subprocess
+import http.client
+from urllib.parse import urlsplit, urlencode
+
+# internal imports
+from .ghcli import GitHubCLIWrapper, cache_results
+from .ghcli import comments_per_page, search_limit
+
+
+def get_backend():
+    # GOIT_BACKEND=api talks to the GitHub API directly instead of via gh
+    if os.getenv("GOIT_BACKEND", "gh") == "api":
+        return GitHubAPIWrapper()
+    return GitHubCLIWrapper()
+
+
+class GitHubAPIWrapper:
+    """
+    Talks to the GitHub REST/GraphQL API directly over a small pool of
+    keep-alive connections, instead of launching gh for every call. The
+    token is borrowed from `gh auth token` once, on first use. Methods
+    mirror GitHubCLIWrapper and return the same JSON shapes gh --json does.
+    """
+
+    def __init__(self, base_url=None, token=None, pool_size=4):
+        super().__init__()
+        u = urlsplit(base_url or os.getenv("GOIT_API_URL", "https://api.github.com"))
+        self._scheme = u.scheme
+        self._netloc = u.netloc
+        self._prefix = u.path.rstrip("/")
+        self._token = token
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _auth(self):
+        if not self._token:
+            retv = subprocess.run("gh auth token", shell=True, capture_output=True)
+            if retv.returncode != 0:
+                self._fail("gh auth token", retv.returncode, retv.stderr.decode())
+            self._token = retv.stdout.decode().strip()
+        return self._token
+
+    def _fail(self, what, status, body):
+        with open("/tmp/goit-ghcli.log", "w+") as f:
+            f.write(what + "\n")
+            f.write(body)
+        raise ValueError(
+            f"Request failed with status {status}. Check /tmp/goit-ghcli.log for details."
+        )
+
+    def _connect(self, fresh=False):
+        if not fresh:
+            try:
+                return self._pool.get_nowait()
+            except queue.Empty:
+                pass
+        if self._scheme == "http":
+            return http.client.HTTPConnection(self._netloc, timeout=30)
+        return http.client.HTTPSConnection(self._netloc, timeout=30)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _headers(self, headers=None):
+        hdrs = {
+            "Authorization": f"Bearer {self._auth()}",
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "goit",
+        }
+        hdrs.update(headers or {})
+        return hdrs
+
+    def _request(self, method, path, body=None, headers=None, ok=(200,)):
+        hdrs = self._headers(headers)
+        if body is not None:
+            body = json.dumps(body).encode()
+            hdrs["Content-Type"] = "application/json"
+        if not path.startswith(self._prefix + "/"):
+            path = self._prefix + path
+
+        # A pooled connection may have been closed by the server while idle,
+        # so retry once on a new one (not the next pooled, maybe just as
+        # stale, one) before giving up.
+        for attempt in (0, 1):
+            conn = self._connect(fresh=attempt)
+            try:
+                conn.request(method, path, body=body, headers=hdrs)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if attempt:
+                    self._fail(f"{method} {path}", type(e).__name__, str(e))
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        if resp.status not in ok:
+            self._fail(f"{method} {path}", resp.status, data.decode(errors="replace"))
+        return (resp.status, resp, data)
+
+    def _get(self, path, **params):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        return json.loads(self._request("GET", path)[2])
+
+    def _paginate(self, path, key=None, limit=1000, **params):
+        retv = []
+        path = f"{path}?{urlencode(params)}" if params else path
+        while path and len(retv) < limit:
+            _, resp, data = self._request("GET", path)
+            data = json.loads(data)
+            retv.extend(data[key] if key else data)
+            path = self._next_link(resp.getheader("Link", ""))
+        return retv[:limit]
+
+    def _next_link(self, link):
+        for part in link.split(","):
+            if 'rel="next"' in part:
+                u = urlsplit(part.split(";")[0].strip(" <>"))
+                return f"{u.path}?{u.query}"
+        return None
+
+    def _graphql(self, query, **variables):
+        data = json.loads(
+            self._request(
+                "POST", "/graphql", body={"query": query, "variables": variables}
+            )[2]
+        )
+        if data.get("errors"):
+            self._fail("POST /graphql", 200, json.dumps(data["errors"], indent=2))
+        return data["data"]
+
+    def _nodes(self, o):
+        # gh flattens `{nodes: [...]}` connections into plain lists
+        if isinstance(o, dict):
+            if set(o.keys()) == {"nodes"}:
+                return [self._nodes(v) for v in o["nodes"]]
+            return {k: self._nodes(v) for k, v in o.items()}
+        if isinstance(o, list):
+            return [self._nodes(v) for v in o]
+        return o
+
+    @cache_results()
+    def get_overview(self, owner=False, repo=False):
+        if not owner or not repo:
+            raise ValueError("Owner and repo must be provided.")
+        info = self._get(f"/repos/{owner}/{repo}")
+        status, _, data = self._request(
+            "GET",
+            f"/repos/{owner}/{repo}/readme",
+            headers={"Accept": "application/vnd.github.raw"},
+            ok=(200, 404),
+        )
+        readme = data.decode() if status == 200 else ""
+        return f"name:\t{owner}/{repo}\ndescription:\t{info.get('description') or ''}\n--\n{readme}"
+
+    @cache_results()
+    def get_repo_info(self, owner=False, repo=False):
+        query = """
+query($owner: String!, $repo: String!) {
+  repository(owner: $owner, name: $repo) {
+    createdAt description diskUsage forkCount homepageUrl id isArchived
+    isFork isPrivate name nameWithOwner pushedAt sshUrl stargazerCount
+    updatedAt url visibility
+    defaultBranchRef { name }
+    issues(states: OPEN) { totalCount }
+    licenseInfo { key name }
+    owner { id login }
+    primaryLanguage { name }
+    pullRequests(states: OPEN) { totalCount }
+    watchers { totalCount }
+  }
+}"""
+        data = self._graphql(query, owner=owner, repo=repo)
+        return json.dumps(self._nodes(data["repository"]))
+
+    @cache_results()
+    def get_repositories(self, owner=False, repo=False):
+        query = """
+query($owner: String!, $after: String) {
+  repositoryOwner(login: $owner) {
+    repositories(first: 100, after: $after, ownerAffiliations: OWNER) {
+      nodes { name owner { id login } }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}"""
+        if not owner or not repo:
+            owner = self._get("/user")["login"]
+            fields = ("owner", "name")
+        else:
+            fields = ("name",)
+
+        retv = []
+        after = None
+        while len(retv) < 2048:
+            data = self._graphql(query, owner=owner, after=after)
+            page = data["repositoryOwner"]["repositories"]
+            retv.extend({k: n[k] for k in fields} for n in page["nodes"])
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        return json.dumps(retv)
+
+    @cache_results()
+    def get_issues(self, owner=False, repo=False):
+        query = """
+query($owner: String!, $repo: String!) {
+  repository(owner: $owner, name: $repo) {
+    issues(first: 100, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes {
+        closed createdAt number state title updatedAt
+        author { login ... on User { id name } }
+      }
+    }
+  }
+}"""
+        data = self._graphql(query, owner=owner, repo=repo)
+        return json.dumps(self._nodes(data["repository"]["issues"]["nodes"]))
+
+    @cache_results()
+    def get_pull_requests(self, owner, repo):
+        query = """
+query($owner: String!, $repo: String!) {
+  repository(owner: $owner, name: $repo) {
+    pullRequests(
+      first: 100, states: OPEN, orderBy: {field: CREATED_AT, direction: DESC}
+    ) {
+      nodes {
+        createdAt number state title updatedAt
+        author { login ... on User { id name } }
+      }
+    }
+  }
+}"""
+        data = self._graphql(query, owner=owner, repo=repo)
+        return json.dumps(self._nodes(data["repository"]["pullRequests"]["nodes"]))
+
+    @cache_results(keys=("number",))
+    def get_item(self, owner, repo, number):
+        return json.dumps(self._get(f"/repos/{owner}/{repo}/issues/{number}"))
+
+    @cache_results(keys=("number", "page"))
+    def get_comments(self, owner, repo, number, page=1):
+        return json.dumps(
+            self._get(
+                f"/repos/{owner}/{repo}/issues/{number}/comments",
+                per_page=comments_per_page,
+                page=page,
+            )
+        )
+
+    def poll_notifications(self, last_modified=None):
+        headers = {"If-Modified-Since": last_modified} if last_modified else {}
+        status, resp, data = self._request(
+            "GET", "/notifications?per_page=50", headers=headers, ok=(200, 304)
+        )
+        headers = {k.lower(): v for k, v in resp.getheaders()}
+        if status == 304:
+            return (status, headers, "")
+        # Threads missing from the list are taken as read, so get every page
+        notes = json.loads(data)
+        path = self._next_link(headers.get("link", ""))
+        if path:
+            notes.extend(self._paginate(path))
+        return (status, headers, json.dumps(notes))
+
+    def stream_diff(self, owner, repo, number):
+        path = f"{self._prefix}/repos/{owner}/{repo}/pulls/{number}"
+        hdrs = self._headers({"Accept": "application/vnd.github.diff"})
+        for attempt in (0, 1):
+            conn = self._connect(fresh=attempt)
+            try:
+                conn.request("GET", path, headers=hdrs)
+                resp = conn.getresponse()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if attempt:
+                    self._fail(f"GET {path}", type(e).__name__, str(e))
+
+        done = False
+        try:
+            if resp.status != 200:
+                self._fail(f"GET {path}", resp.status, resp.read().decode())
+            try:
+                for line in resp:
+                    yield line.decode(errors="replace").rstrip("\r\n")
+                # Line iteration stops quietly if the server hangs up early
+                if resp.length:
+                    raise http.client.IncompleteRead(b"", resp.length)
+                # It also leaves the response open at EOF, read() marks it
+                # finished so the connection can take another request
+                resp.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._fail(f"GET {path}", type(e).__name__, str(e))
+            done = resp.isclosed()
+        finally:
+            # Half read responses can't be reused, so only pool finished ones
+            if done and not resp.will_close:
+                self._release(conn)
+            else:
+                conn.close()
+
+    @cache_results()
+    def get_actions(self, owner, repo):
+        data = self._get(f"/repos/{owner}/{repo}/actions/runs", per_page=75)
+        retv = []
+        for run in data["workflow_runs"]:
+            retv.append(
+                {
+                    "attempt": run["run_attempt"],
+                    "conclusion": run["conclusion"] or "",
+                    "createdAt": run["created_at"],
+                    "databaseId": run["id"],
+                    "displayTitle": run["display_title"],
+                    "event": run["event"],
+                    "headBranch": run["head_branch"],
+                    "headSha": run["head_sha"],
+                    "name": run["name"],
+                    "number": run["run_number"],
+                    "startedAt": run["run_started_at"],
+                    "status": run["status"],
+                    "updatedAt": run["updated_at"],
+                    "url": run["html_url"],
+                    "workflowDatabaseId": run["workflow_id"],
+                    "workflowName": run["name"],
+                }
+            )
+        return json.dumps(retv)
+
+    def _search(self, owner, kind):
+        items = self._paginate(
+            "/search/issues",
+            key="items",
+            limit=search_limit,
+            q=f"user:{owner} is:open is:{kind}",
+            per_page=100,
+        )
+        retv = []
+        for item in items:
+            name_with_owner = item["repository_url"].split("/repos/", 1)[-1]
+            retv.append(
+                {
+                    "author": {"login": item["user"]["login"]},
+                    "createdAt": item["created_at"],
+                    "number": item["number"],
+                    "repository": {
+                        "name": name_with_owner.split("/")[-1],
+                        "nameWithOwner": name_with_owner,
+                    },
+                    "title": item["title"],
+                    "updatedAt": item["updated_at"],
+                    "url": item["html_url"],
+                }
+            )
+        return json.dumps(retv)
+
+    @cache_results()
+    def search_issues(self, owner=False, repo=False):
+        return self._search(owner, "issue")
+
+    @cache_results()
+    def search_pull_requests(self, owner=False, repo=False):
+        return self._search(owner, "pr")
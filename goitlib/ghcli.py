@@ -5,23 +5,33 @@ import os
 import json
 import logging
 import functools
+import threading
 import subprocess
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 # internal imports
 from .edict import Edict
+from .rowstore import RowStore
 
 # 3rd party imports
+from rich.rule import Rule
+from rich.console import Group
 from rich.markdown import Markdown
 
 # Global settings for cache
 cache_dir = os.path.join(os.getenv("HOME"), ".cache", "goit")
 cache_age = 60 * 30  # 30 minutes in seconds
+comments_per_page = 30
+search_limit = 1000  # most results the search API hands out per query
 
 os.makedirs(f"{cache_dir}/data", exist_ok=True)
 
 
-def cache_results():
+def cache_file(owner, repo, name, extra=""):
+    return os.path.join(f"{cache_dir}/data", f"{owner}_-_{repo}{extra}_-_{name}.json")
+
+
+def cache_results(keys=()):
     global cache_dir
     global cache_age
 
@@ -40,7 +50,9 @@ def cache_results():
             # Retrieve `owner` and `repo` from kwargs at runtime
             owner = kwargs.get("owner", "default")
             repo = kwargs.get("repo", "default")  # default if repo is not provided
-            bypass_cache = kwargs.get("bypass_cache", False)
+            bypass_cache = kwargs.pop("bypass_cache", False)
+            # Per-item entries are only stale once the item itself changes
+            updated_at = kwargs.pop("updated_at", None)
 
             if owner is None:
                 error_message = (
@@ -49,18 +61,24 @@ def cache_results():
                 logger.error(error_message)
                 raise ValueError(error_message)
 
-            # Generate cache file path using owner and repo (if provided)
-            cache_filename = f"{owner}_-_{repo}_-_{func.__name__}.json"
-            cache_path = os.path.join(f"{cache_dir}/data", cache_filename)
+            # Generate cache file path using owner, repo and any extra keys
+            extra = "".join(f"_-_{kwargs.get(k)}" for k in keys)
+            cache_path = cache_file(owner, repo, func.__name__, extra)
 
             # Check if cache bypass is requested
             if not bypass_cache and os.path.exists(cache_path):
                 file_mtime = datetime.fromtimestamp(os.path.getmtime(cache_path))
+                if updated_at:
+                    valid = file_mtime.timestamp() >= datetime.fromisoformat(
+                        updated_at.replace("Z", "+00:00")
+                    ).timestamp()
+                else:
+                    valid = datetime.now() - file_mtime < timedelta(seconds=cache_age)
                 # If cache is valid, return cached data
-                if datetime.now() - file_mtime < timedelta(seconds=cache_age):
+                if valid:
                     logger.info("Cache hit for %s/%s on %s", owner, repo, func.__name__)
-                    with open(cache_path, "r") as cache_file:
-                        return json.load(cache_file)
+                    with open(cache_path, "r") as f:
+                        return json.load(f)
                 else:
                     logger.info(
                         "Cache expired for %s/%s on %s", owner, repo, func.__name__
@@ -72,8 +90,12 @@ def cache_results():
 
             # Call the original function and cache the result
             result = func(*args, **kwargs)
-            with open(cache_path, "w") as cache_file:
-                json.dump(result, cache_file)
+            # Write then rename, the cache warmer may be refreshing entries
+            # while the UI reads them
+            with open(f"{cache_path}.{os.getpid()}.{threading.get_ident()}", "w") as f:
+                json.dump(result, f)
+                tmp_path = f.name
+            os.replace(tmp_path, cache_path)
             logger.info("Cache updated for %s/%s on %s", owner, repo, func.__name__)
 
             return result
@@ -99,6 +121,7 @@ class GitHubCLIWrapper:
             )
         return retv.stdout.decode()
 
+    @cache_results()
     def get_overview(self, owner=False, repo=False):
         if not owner or not repo:
             raise ValueError("Owner and repo must be provided.")
@@ -188,25 +211,15 @@ class GitHubCLIWrapper:
 
     @cache_results()
     def get_issues(self, owner=False, repo=False):
+        # Only what the list shows, bodies and comments load on demand
         fields = (
-            "assignees",
             "author",
-            "body",
             "closed",
-            "closedAt",
-            "comments",
             "createdAt",
-            "id",
-            # "isPinned",
-            "labels",
-            "milestone",
             "number",
-            "reactionGroups",
             "state",
-            # "stateReason",
             "title",
             "updatedAt",
-            "url",
         )
         self._cmd_s = (
             f"gh issue list -R {owner}/{repo} -L 100 -s all --json {','.join(fields)}"
@@ -217,23 +230,95 @@ class GitHubCLIWrapper:
     def get_pull_requests(self, owner, repo):
         fields = (
             "author",
-            "body",
-            "closed",
-            "closedAt",
-            "comments",
             "createdAt",
-            "isDraft",
-            "mergeable",
-            "mergedAt",
             "number",
             "state",
             "title",
             "updatedAt",
-            "url",
         )
         self._cmd_s = f'gh pr list -R {owner}/{repo} -L 100 --json {",".join(fields)}'
         return self._cmd()
 
+    # Issues and pull requests share the issues endpoints for body/comments
+    @cache_results(keys=("number",))
+    def get_item(self, owner, repo, number):
+        self._cmd_s = f"gh api repos/{owner}/{repo}/issues/{number}"
+        return self._cmd()
+
+    @cache_results(keys=("number", "page"))
+    def get_comments(self, owner, repo, number, page=1):
+        self._cmd_s = f"gh api 'repos/{owner}/{repo}/issues/{number}/comments?per_page={comments_per_page}&page={page}'"
+        return self._cmd()
+
+    # Not cached either, the conditional request is the cache: an unchanged
+    # inbox answers 304 and doesn't count against the rate limit. This runs
+    # on a timer alongside other calls, so it keeps its command local.
+    def poll_notifications(self, last_modified=None):
+        status, headers, body = self._api_head(
+            "notifications?per_page=50", last_modified
+        )
+        if status == 304:
+            return (status, headers, body)
+        # Threads missing from the list are taken as read, so get every page
+        notes = json.loads(body)
+        link = headers.get("link", "")
+        while 'rel="next"' in link:
+            url = [p for p in link.split(",") if 'rel="next"' in p][0]
+            _, page_h, page = self._api_head(url.split(";")[0].strip(" <>"))
+            notes.extend(json.loads(page))
+            link = page_h.get("link", "")
+        return (status, headers, json.dumps(notes))
+
+    def _api_head(self, path, last_modified=None):
+        # `gh api -i`, split into (status, lowercased headers, body)
+        cmd = f"gh api -i '{path}'"
+        if last_modified:
+            cmd += f" -H 'If-Modified-Since: {last_modified}'"
+        retv = subprocess.run(cmd, shell=True, capture_output=True)
+        # gh exits non-zero for anything but 2xx, including 304
+        out = retv.stdout.decode().replace("\r\n", "\n")
+        head, _, body = out.partition("\n\n")
+        lines = head.split("\n")
+        status = int(lines[0].split()[1]) if lines[0].startswith("HTTP/") else 0
+        if status not in (200, 304):
+            with open("/tmp/goit-ghcli.log", "w+") as f:
+                f.write(cmd + "\n")
+                f.write(out)
+                f.write(retv.stderr.decode())
+            raise ValueError(
+                f"Command failed with exit code {retv.returncode}. Check /tmp/goit-ghcli.log for details."
+            )
+        headers = {}
+        for line in lines[1:]:
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+        return (status, headers, body)
+
+    # Not cached, diffs can run to megabytes and are consumed as they arrive
+    def stream_diff(self, owner, repo, number):
+        # A local command, this runs on a worker thread alongside other calls
+        cmd = f"gh pr diff {number} -R {owner}/{repo} --color never"
+        proc = subprocess.Popen(
+            cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        done = False
+        try:
+            for line in proc.stdout:
+                yield line.decode(errors="replace").rstrip("\r\n")
+            done = True
+        finally:
+            # The reader went away early, don't leave gh running
+            if not done:
+                proc.kill()
+            proc.wait()
+        if proc.returncode != 0:
+            with open("/tmp/goit-ghcli.log", "w+") as f:
+                f.write(cmd + "\n")
+                f.write(proc.stderr.read().decode())
+            raise ValueError(
+                f"Command failed with exit code {proc.returncode}. Check /tmp/goit-ghcli.log for details."
+            )
+
     @cache_results()
     def get_actions(self, owner, repo):
         fields = (
@@ -257,11 +342,51 @@ class GitHubCLIWrapper:
         self._cmd_s = f'gh run list -R {owner}/{repo} -L 75 --json {",".join(fields)}'
         return self._cmd()
 
+    # The search API caps results at 1000 per query, gh pages through them
+    # 100 at a time, so an org wide listing costs a handful of requests
+    # instead of one per repository.
+    @cache_results()
+    def search_issues(self, owner=False, repo=False):
+        fields = (
+            "author",
+            "createdAt",
+            "number",
+            "repository",
+            "title",
+            "updatedAt",
+            "url",
+        )
+        self._cmd_s = f"gh search issues --owner {owner} --state open -L {search_limit} --json {','.join(fields)}"
+        return self._cmd()
+
+    @cache_results()
+    def search_pull_requests(self, owner=False, repo=False):
+        fields = (
+            "author",
+            "createdAt",
+            "number",
+            "repository",
+            "title",
+            "updatedAt",
+            "url",
+        )
+        self._cmd_s = f"gh search prs --owner {owner} --state open -L {search_limit} --json {','.join(fields)}"
+        return self._cmd()
+
 
 class DataPipeline:
 
     _gh = GitHubCLIWrapper()
 
+    def __init__(self, gh=None):
+        if gh is not None:
+            self._gh = gh
+        self._updated = {}
+        self._notes = {}
+        self._notes_lm = None
+        self._notes_polled = False
+        self.poll_interval = 60
+
     def get_overview(self, o, r):
         data = self._gh.get_overview(owner=o, repo=r)
         jdat = Edict(**json.loads(self._gh.get_repo_info(owner=o, repo=r)))
@@ -281,94 +406,301 @@ class DataPipeline:
 
     def get_issues(self, o, r):
         data = json.loads(self._gh.get_issues(owner=o, repo=r))
-        mydoc = []
-        open_i = closed_i = 0
+        store = RowStore(
+            (
+                ("number", "int"),
+                ("state", "enum"),
+                ("author", "str"),
+                ("createdAt", "time"),
+                ("updatedAt", "time"),
+                ("title", "str"),
+            ),
+            (
+                ("number", None),
+                ("state", self._fmt_state),
+                ("author", None),
+                ("createdAt", self._fmt_age),
+                ("updatedAt", self._fmt_updated),
+                ("title", None),
+            ),
+        )
 
         for datum in data:
             d = Edict(**datum)
-            if d.closed:
-                closed_i += 1
-            else:
-                open_i += 1
-                us = d.updatedAt if d.get("updatedAt", False) else False
-                _us = (
-                    datetime.fromisoformat(d.updatedAt.replace("Z", "+00:00"))
-                    if us
-                    else None
-                )
-                updated = (
-                    _us.strftime("%a{c} %b %d{c} %Y {at} %I:%M%p").format(
-                        c="[yellow],[/]", at="[cyan]@[/]"
-                    )
-                    if us
-                    else ""
-                )
+            self._updated[(o, r, d.number)] = d.updatedAt
+            store.append(
+                number=d.number,
+                state=d.state,
+                author=d.author.name or d.author.login,
+                createdAt=d.createdAt,
+                updatedAt=d.updatedAt,
+                title=d.title,
+            )
 
-                age = self._get_age(d.createdAt)
-                mydoc.append((d.number, d.author.name, age, updated, d.title))
+        counts = store.group_by("state")
+        store.filter("state", "OPEN")
+        richTxt = f"🌐[underline]:[/] {len(data)}   🟢[underline]:[/] {counts.get('OPEN', 0)}   🔒[underline]:[/] {counts.get('CLOSED', 0)}\n"
 
-        richTxt = f"🌐[underline]:[/] {len(data)}   🟢[underline]:[/] {open_i}   🔒[underline]:[/] {closed_i}\n"
+        return (richTxt, store)
 
-        return (richTxt, mydoc)
+    def _fmt_state(self, state, now=None):
+        return {"OPEN": "🟢", "CLOSED": "🔒"}.get(state, "🔵")
 
-    def _get_age(self, created_at):
-        cs = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-        _cs = date(cs.year, cs.month, cs.day)
-        now = datetime.now()
-        _ns = date(now.year, now.month, now.day)
-
-        if (_ns - _cs).days < 5:
-            age = f"[green]{(_ns - _cs).days:4d}[/] days"
-        elif (_ns - _cs).days < 10:
-            age = f"[yellow]{(_ns - _cs).days:4d}[/] days"
+    def _fmt_updated(self, us, now=None):
+        if not us:
+            return ""
+        return us.strftime("%a{c} %b %d{c} %Y {at} %I:%M%p").format(
+            c="[yellow],[/]", at="[cyan]@[/]"
+        )
+
+    def _fmt_age(self, cs, now):
+        days = (now.astimezone().date() - cs.astimezone().date()).days
+
+        if days < 5:
+            age = f"[green]{days:4d}[/] days"
+        elif days < 10:
+            age = f"[yellow]{days:4d}[/] days"
         else:
-            age = f"[red]{(_ns - _cs).days:4d}[/] days"
+            age = f"[red]{days:4d}[/] days"
 
         return age
 
+    def _get_updated(self, updated_at):
+        if not updated_at:
+            return ""
+        return self._fmt_updated(
+            datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+        )
+
+    def _get_age(self, created_at):
+        return self._fmt_age(
+            datetime.fromisoformat(created_at.replace("Z", "+00:00")),
+            datetime.now(timezone.utc),
+        )
+
     def get_pull_requests(self, o, r):
-        retv = []  # ("foo", "bar", "baz", "qux", "quux")]
         data = json.loads(self._gh.get_pull_requests(owner=o, repo=r))
+        store = RowStore(
+            (
+                ("number", "int"),
+                ("createdAt", "time"),
+                ("state", "enum"),
+                ("author", "str"),
+                ("title", "str"),
+            ),
+            (
+                ("number", None),
+                ("createdAt", self._fmt_age),
+                ("state", self._fmt_state),
+                ("author", None),
+                ("title", None),
+            ),
+        )
 
         for datum in data:
             d = Edict(**datum)
-            state = "🔵"
+            self._updated[(o, r, d.number)] = d.updatedAt
+            store.append(
+                number=d.number,
+                createdAt=d.createdAt,
+                state=d.state,
+                author=d.author.name or d.author.login,
+                title=d.title,
+            )
 
-            if d.state == "OPEN":
-                state = "🟢"
-            elif d.state == "CLOSED":
-                state = "🔒"
+        return ("Pull Requests", store)
 
-            age = self._get_age(d.createdAt)
-            retv.append((d.number, age, state, d.author.name, d.title))
+    def get_detail(self, o, r, number, pages=1):
+        updated_at = self._updated.get((o, r, number))
+        d = Edict(
+            **json.loads(
+                self._gh.get_item(
+                    owner=o, repo=r, number=number, updated_at=updated_at
+                )
+            )
+        )
+        retv = [Markdown(d.body or "_No description provided._")]
+        pages = min(pages, max(1, -(-d.comments // comments_per_page)))
 
-        return ("Pull Requests", retv)
+        for page in range(1, pages + 1):
+            data = json.loads(
+                self._gh.get_comments(
+                    owner=o, repo=r, number=number, page=page, updated_at=updated_at
+                )
+            )
+            for datum in data:
+                c = Edict(**datum)
+                retv.append(
+                    Rule(
+                        f"[cyan]{c.user.login}[/] {self._get_updated(c.created_at)}",
+                        style="grey50",
+                    )
+                )
+                retv.append(Markdown(c.body or ""))
+
+        shown = min(d.comments, pages * comments_per_page)
+        more = " ([underline]ctrl+n[/] for more)" if shown < d.comments else ""
+        richTxt = f"[bold]#{d.number}[/] {d.title}\n👤[underline]:[/] [cyan]{d.user.login}[/]   💬[underline]:[/] {shown}/{d.comments}{more}\n"
+
+        return (richTxt, Group(*retv))
+
+    def poll_notifications(self):
+        """Fetch the inbox if it changed, returns True when it did."""
+        status, headers, body = self._gh.poll_notifications(
+            last_modified=self._notes_lm
+        )
+        self.poll_interval = int(headers.get("x-poll-interval", self.poll_interval))
+        self._notes_lm = headers.get("last-modified", self._notes_lm)
+        if status == 304:
+            return False
+        # Only unread threads come back, anything missing was read elsewhere.
+        # Swap in a new dict, the UI may be reading the old one.
+        notes = {k: dict(v, unread=False) for k, v in self._notes.items()}
+        for datum in json.loads(body):
+            notes[datum["id"]] = datum
+        self._notes = notes
+        self._notes_polled = True
+        return True
+
+    def get_notifications(self, o=None, r=None):
+        # Fetching is left to the background poller, this only reads
+        store = RowStore(
+            (
+                ("id", "str"),
+                ("unread", "enum"),
+                ("repo", "str"),
+                ("type", "enum"),
+                ("number", "int"),
+                ("title", "str"),
+                ("reason", "str"),
+                ("updatedAt", "time"),
+            ),
+            (
+                ("unread", lambda v, now=None: "🔵" if v else ""),
+                ("repo", None),
+                ("type", self._fmt_subject),
+                ("title", None),
+                ("reason", None),
+                ("updatedAt", self._fmt_updated),
+            ),
+        )
+
+        for datum in self._notes.values():
+            d = Edict(**datum)
+            number = (d.subject.url or "").rsplit("/", 1)[-1]
+            store.append(
+                id=d.id,
+                unread=d.unread,
+                repo=d.repository.full_name,
+                type=d.subject.type,
+                number=int(number) if number.isdigit() else None,
+                title=d.subject.title,
+                reason=d.reason,
+                updatedAt=d.updated_at,
+            )
+        store.sort("updatedAt", True)
+
+        unread = store.group_by("unread").get(True, 0)
+        richTxt = f"🔔[underline]:[/] {len(store)}   🔵[underline]:[/] {unread}\n"
+        if not self._notes_polled:
+            richTxt = "[cyan]Fetching notifications[/][underline]...[/]\n"
+
+        return (richTxt, store)
+
+    def _fmt_subject(self, t, now=None):
+        return {
+            "Issue": "❗",
+            "PullRequest": "🔗",
+            "Release": "📦",
+            "Discussion": "💬",
+            "CheckSuite": "⚙️",
+            "WorkflowRun": "⚙️",
+        }.get(t, t)
+
+    def stream_diff(self, o, r, number):
+        return self._gh.stream_diff(owner=o, repo=r, number=number)
 
     def get_actions(self, o, r):
         data = json.loads(self._gh.get_actions(owner=o, repo=r))
-        retv = []
+        store = RowStore(
+            (
+                ("number", "int"),
+                ("attempt", "int"),
+                ("event", "enum"),
+                ("conclusion", "enum"),
+                ("name", "str"),
+            ),
+            (
+                ("number", None),
+                ("attempt", None),
+                ("event", self._fmt_event),
+                ("conclusion", self._fmt_conclusion),
+                ("name", None),
+            ),
+        )
 
         for datum in data:
             d = Edict(**datum)
-            c = d.conclusion
-            e = d.event
-
-            if c == "success":
-                c = "🟢"
-            elif c == "failure":
-                c = "🔴"
-            elif c == "skipped":
-                c = "🚫"
-
-            if e == "pull_request":
-                e = "📬"
-            elif e == "merge_group":
-                e = "🔗"
-            elif e == "issues":
-                e = "🔧"
-            elif e == "push":
-                e = "🚀"
-
-            retv.append((d.number, d.attempt, e, c, d.name))
-
-        return ("Actions", retv)
+            store.append(
+                number=d.number,
+                attempt=d.attempt,
+                event=d.event,
+                conclusion=d.conclusion,
+                name=d.name,
+            )
+
+        return ("Actions", store)
+
+    def _fmt_conclusion(self, c, now=None):
+        return {"success": "🟢", "failure": "🔴", "skipped": "🚫"}.get(c, c)
+
+    def _fmt_event(self, e, now=None):
+        return {
+            "pull_request": "📬",
+            "merge_group": "🔗",
+            "issues": "🔧",
+            "push": "🚀",
+        }.get(e, e)
+
+    def get_dashboard(self, o, r):
+        issues = json.loads(self._gh.search_issues(owner=o))
+        pulls = json.loads(self._gh.search_pull_requests(owner=o))
+        repos = {}
+
+        for key, data in (("issues", issues), ("pulls", pulls)):
+            for datum in data:
+                d = Edict(**datum)
+                name = d.repository.name
+                if name not in repos:
+                    repos[name] = Edict(
+                        issues=0, pulls=0, oldest=d.createdAt, updated=d.updatedAt
+                    )
+                repos[name][key] += 1
+                if d.createdAt < repos[name].oldest:
+                    repos[name].oldest = d.createdAt
+                if d.updatedAt > repos[name].updated:
+                    repos[name].updated = d.updatedAt
+
+        retv = []
+        for name, d in sorted(
+            repos.items(), key=lambda i: (-(i[1].issues + i[1].pulls), i[0])
+        ):
+            retv.append(
+                (
+                    name,
+                    d.issues,
+                    d.pulls,
+                    self._get_age(d.oldest),
+                    self._get_updated(d.updated),
+                )
+            )
+
+        # Past the search cap the per repo counts are only partial
+        counts = [
+            f"{len(d)}+" if len(d) >= search_limit else len(d) for d in (issues, pulls)
+        ]
+        richTxt = f"📦[underline]:[/] {len(repos)}   ❗[underline]:[/] {counts[0]}   🔗[underline]:[/] {counts[1]}\n"
+        if len(issues) >= search_limit or len(pulls) >= search_limit:
+            richTxt += f"[yellow]Search results are capped at {search_limit}, counts below are partial.[/]\n"
+
+        return (richTxt, retv)
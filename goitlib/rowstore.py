@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# stdlib imports
+from datetime import datetime, timezone
+
+
+class RowStore:
+    """
+    A column oriented table of typed values, built once per fetch. Sorting
+    and filtering only reorder a list of row indices; values are turned into
+    Rich markup when rows are handed to a table, and only for the rows that
+    survive the current filters.
+
+    Column types are "int", "str", "enum" and "time" (ISO 8601 strings,
+    parsed to aware datetimes on append).
+    """
+
+    def __init__(self, columns, display):
+        self.types = dict(columns)
+        self.data = {name: [] for name in self.types}
+        # [(column, formatter)], formatter is called as fmt(value, now)
+        self.display = list(display)
+        self.filters = {}
+        self.sort_key = None
+        self.reverse = False
+        self.order = []
+
+    def __len__(self):
+        return len(self.order)
+
+    def append(self, **values):
+        for name, kind in self.types.items():
+            v = values.get(name)
+            if kind == "time" and v:
+                v = datetime.fromisoformat(v.replace("Z", "+00:00"))
+            self.data[name].append(v)
+        self.order.append(len(self.data[name]) - 1)
+
+    def column(self, index):
+        return self.display[index][0]
+
+    def value(self, row, column):
+        """The raw value of `column` for the `row`th visible row."""
+        return self.data[column][self.order[row]]
+
+    def sort(self, column, reverse=False):
+        self.sort_key = column
+        self.reverse = reverse
+        self._refresh()
+
+    def filter(self, column, value=None):
+        """Only keep rows where `column` equals `value`; None clears it."""
+        if value is None:
+            self.filters.pop(column, None)
+        else:
+            self.filters[column] = value
+        self._refresh()
+
+    def group_by(self, column):
+        retv = {}
+        for i in self.order:
+            v = self.data[column][i]
+            if self.types[column] == "time" and v:
+                v = v.date()
+            retv[v] = retv.get(v, 0) + 1
+        return dict(sorted(retv.items(), key=lambda i: -i[1]))
+
+    def rows(self, start=0, stop=None):
+        """
+        Formatted display tuples for visible rows `start:stop`. The tables
+        take the whole filtered view, since DataTable sizes its columns and
+        scrollbar from every row it holds and lists are at most 100 long.
+        """
+        now = datetime.now(timezone.utc)
+        retv = []
+        for i in self.order[start:stop]:
+            row = []
+            for name, fmt in self.display:
+                v = self.data[name][i]
+                row.append(fmt(v, now) if fmt else v)
+            retv.append(tuple(row))
+        return retv
+
+    def _refresh(self):
+        size = len(next(iter(self.data.values()), []))
+        order = [
+            i
+            for i in range(size)
+            if all(self.data[k][i] == v for k, v in self.filters.items())
+        ]
+        if self.sort_key:
+            col = self.data[self.sort_key]
+            # Missing values always sort last
+            order.sort(key=lambda i: (col[i] is None, col[i]), reverse=self.reverse)
+            if self.reverse:
+                order = [i for i in order if col[i] is not None] + [
+                    i for i in order if col[i] is None
+                ]
+        self.order = order
@@ -7,14 +7,22 @@ import asyncio
 import logging
 import functools
 import subprocess
+from hashlib import sha256
+from collections import OrderedDict
 from datetime import date, datetime
 
 # internal imports
 from .edict import *
 from .ghcli import *
+from .rowstore import *
+from .warmer import *
+from .ghapi import *
+from .diffview import *
 
 # 3rd party imports
 from rich.text import Text
+from rich.console import Group
+from rich.segment import Segments
 from rich.markdown import Markdown
 from textual.app import App
 from textual.events import Key
@@ -35,6 +43,10 @@ md = """
 :warning: :warning: :warning:
 """
 repo_data = {}
+# Rendered README sections, keyed by (sha256 of the markdown, width)
+md_cache = OrderedDict()
+md_cache_size = 64
+md_chunk_size = 16 * 1024  # READMEs larger than this render progressively
 GH = Edict(
     **{
         "repo_list": "gh repo list --json owner,name -L 1024",
@@ -45,10 +57,24 @@ GH = Edict(
 
 
 ## Main app code
+class OverviewScroll(VerticalScroll):
+    """The README pane, re-rendered to fit whenever its size changes."""
+
+    def on_resize(self, event):
+        self.app.refit_overview()
+
+
 class GridApp(App):
-    DP = DataPipeline()
+    DP = DataPipeline(get_backend())
     STAB = 0
-    TABS = ["Overview", "Issues", "PullRequests", "Actions"]
+    TABS = [
+        "Overview",
+        "Issues",
+        "PullRequests",
+        "Actions",
+        "Notifications",
+        "Dashboard",
+    ]
     CSS = """
 Screen { layout: grid; grid-size: 4 5; overflow: auto auto; }
 Static { color: auto 100%; height: 100%; padding: 0 1; }
@@ -63,6 +89,8 @@ Text { width: auto; }
 #repos { row-span: 5; height: 100%; }
 #repos_c { height: 100%; }
 .data-table-column { text-align: left; }
+.detail { display: none; height: 1fr; border-top: solid grey; padding: 0 1; }
+.detail Label { width: 100%; }
 #main { border: round grey; height: 100%; min-width: 50%; width: 100%; row-span: 5; column-span: 4; }
 """
     BINDINGS = [
@@ -70,8 +98,22 @@ Text { width: auto; }
         ("ctrl+s", "show_tab('issues')", "issues"),
         ("ctrl+r", "show_tab('pullrequests')", "pull requests"),
         ("ctrl+a", "show_tab('actions')", "actions"),
+        ("ctrl+t", "show_tab('notifications')", "notifications"),
+        ("ctrl+b", "show_tab('dashboard')", "dashboard"),
+        ("ctrl+n", "more_comments()", "more comments"),
+        ("ctrl+f", "filter_column()", "filter"),
+        ("ctrl+g", "group_column()", "group"),
+        ("ctrl+d", "show_diff()", "diff"),
         # ("/", "focus_search()", "search"),
     ]
+    MAIN_ACTIONS = {a.split("(")[0] for _, a, _ in BINDINGS}
+
+    def check_action(self, action, parameters):
+        # The tab keys only make sense on the main screen, this also keeps
+        # them out of the diff screen's footer
+        if action in self.MAIN_ACTIONS:
+            return self.screen is self.screen_stack[0]
+        return True
 
     def action_focus_search(self):
         with open("debug.log", "w+") as fp:
@@ -111,10 +153,89 @@ Text { width: auto; }
 
     def get_overview(self, o=False, r=False):
         data = self.DP.get_overview(self.S_ORG, self.S_REPO)
-        return (data[0], Markdown(data[1]))
+        width = self._md_w = self._md_width()
+        # Any progressive render still running belongs to an older visit
+        self._md_gen = getattr(self, "_md_gen", 0) + 1
+
+        if len(data[1]) <= md_chunk_size:
+            return (data[0], self._render_md(data[1], width))
+
+        # Large documents get the first section straight away, the rest are
+        # rendered a section at a time between screen refreshes.
+        sections = self._split_md(data[1])
+        parts = [self._render_md(sections[0], width)]
+        self.call_after_refresh(
+            self._render_md_more, self._md_gen, parts, sections[1:], width
+        )
+        return (data[0], Group(*parts))
+
+    def _md_width(self):
+        width = self.query_one("#overview_sc").size.width
+        if width <= 2:
+            # The pane isn't laid out until its tab has been shown, start
+            # from the tabs' width, the pane's first resize fits it properly
+            width = self.query_one("#main").content_region.width
+        return max(width - 2, 20)
+
+    def refit_overview(self):
+        # Re-render the README when the pane no longer matches its width
+        if getattr(self, "_md_w", None) is None:
+            return
+        if self.query_one("#main", TabbedContent).active != "overview":
+            return
+        width = self.query_one("#overview_sc").size.width
+        if width > 2 and max(width - 2, 20) != self._md_w:
+            self.query_one("#overview_md", Label).update(self.get_overview()[1])
+
+    def _render_md(self, text, width):
+        key = (sha256(text.encode()).hexdigest(), width)
+        if key in md_cache:
+            md_cache.move_to_end(key)
+            return md_cache[key]
+
+        lines = self.console.render_lines(
+            Markdown(text), self.console.options.update_width(width), new_lines=True
+        )
+        retv = Segments([seg for line in lines for seg in line])
+        md_cache[key] = retv
+        if len(md_cache) > md_cache_size:
+            md_cache.popitem(last=False)
+        return retv
+
+    def _render_md_more(self, gen, parts, sections, width):
+        # Bail out if the overview was shown again in the meantime
+        if gen != self._md_gen or not sections:
+            return
+        parts.append(self._render_md(sections[0], width))
+        self.query_one("#overview_md", Label).update(Group(*parts))
+        if len(sections) > 1:
+            self.call_after_refresh(
+                self._render_md_more, gen, parts, sections[1:], width
+            )
+
+    def _split_md(self, text):
+        # Split on headings, keeping fenced code blocks in one piece
+        retv = []
+        chunk = []
+        fence = False
+        size = 0
+        for line in text.splitlines(keepends=True):
+            if line.lstrip().startswith(("```", "~~~")):
+                fence = not fence
+            if not fence and line.startswith("#") and size >= md_chunk_size // 4:
+                retv.append("".join(chunk))
+                chunk = []
+                size = 0
+            chunk.append(line)
+            size += len(line)
+        if chunk:
+            retv.append("".join(chunk))
+        return retv
 
     def action_show_tab(self, tab):
         lt = tab.lower()
+        if lt != "notifications":
+            record_access(self.S_ORG, None if lt == "dashboard" else self.S_REPO, lt)
         self._please_wait(tab)
         self.get_child_by_type(TabbedContent).active = tab
         datum = (f"#{lt}_dt", DataTable)
@@ -129,6 +250,12 @@ Text { width: auto; }
         elif lt == "actions":
             cb = self.DP.get_actions
             focus = self.query_one("#actions_dt")
+        elif lt == "dashboard":
+            cb = self.DP.get_dashboard
+            focus = self.query_one("#dashboard_dt")
+        elif lt == "notifications":
+            cb = self.DP.get_notifications
+            focus = self.query_one("#notifications_dt")
         elif lt == "overview":
             cb = self.get_overview
             datum = (f"#{lt}_md", Label)
@@ -158,10 +285,15 @@ Text { width: auto; }
             repos_l.append(ListItem(Label(repo)))
         self.S_ORG = list(repo_data.keys())[0]
         self.S_REPO = repos_t[0]
+        # Per tab (summary, RowStore) and the column picked by header click
+        self.STORES = {}
+        self.S_COL = {}
         datas = {
             "pullrequests": ("Number", "Age", "State", "Author", "Title"),
-            "issues": ("Issue", "Author", "Age", "Updated @", "Description"),
+            "issues": ("Issue", "State", "Author", "Age", "Updated @", "Description"),
             "actions": ("Number", "Attempt", "Event", "Result", "Name"),
+            "dashboard": ("Repository", "Issues", "PRs", "Oldest", "Updated @"),
+            "notifications": ("", "Repository", "Type", "Title", "Reason", "Updated @"),
         }
         for tab in self.TABS:
             if tab.lower() != "overview":
@@ -169,20 +301,170 @@ Text { width: auto; }
                 dim = dt.size
                 dt.add_columns(*datas[tab.lower()])
         self.post_message(Key("ctrl+o", "o"))
+        # Keep the usual working set hot in the background
+        self.set_interval(cache_age // 3, self.warm_cache)
+        self.warm_cache()
+        self.poll_notifications()
+
+    def poll_notifications(self):
+        self.run_worker(self._poll_notifications, thread=True, group="notifications")
+
+    def _poll_notifications(self):
+        try:
+            changed = self.DP.poll_notifications()
+        except ValueError as e:
+            changed = False
+            self.call_from_thread(self.notify, str(e), severity="error")
+        self.call_from_thread(self.notifications_polled, changed)
+
+    def notifications_polled(self, changed):
+        # The server says how often we may ask, it can change between polls
+        self.set_timer(self.DP.poll_interval, self.poll_notifications)
+        if not changed or "notifications" not in self.STORES:
+            return
+        dt = self.query_one("#notifications_dt", DataTable)
+        store = self.STORES["notifications"][1]
+        cursor = store.value(dt.cursor_row, "id") if len(store) else None
+        self.STORES["notifications"] = self.DP.get_notifications()
+        self.refresh_table("notifications")
+        store = self.STORES["notifications"][1]
+        for i in range(len(store)):
+            if store.value(i, "id") == cursor:
+                dt.move_cursor(row=i)
+
+    def warm_cache(self):
+        self.run_worker(
+            functools.partial(warm, self.DP._gh), thread=True, group="warm", exclusive=True
+        )
+
+    def show_org(self, org):
+        repos_l = self.query_one("#repos", ListView)
+        repos_l.clear()
+        repos_t = copy.copy(repo_data.get(org, []))
+        repos_t.sort()
+        self.S_ORG = org
+        for repo in repos_t:
+            repos_l.append(ListItem(Label(repo)))
 
     def on_list_view_selected(self, event):
         if event.list_view.id == "orgs":
-            repos_l = self.query_one("#repos", ListView)
-            repos_l.clear()
-            repos_t = copy.copy(repo_data[str(event.item.query_one(Label).renderable)])
-            repos_t.sort()
-            self.S_ORG = str(event.item.query_one(Label).renderable)
-            for repo in repos_t:
-                repos_l.append(ListItem(Label(repo)))
-            repos_l.focus()
+            self.show_org(str(event.item.query_one(Label).renderable))
+            self.query_one("#repos", ListView).focus()
         elif event.list_view.id == "repos":
             self.S_REPO = str(event.item.query_one(Label).renderable)
+            record_access(self.S_ORG, self.S_REPO)
+            self.post_message(Key("ctrl+o", "o"))
+
+    def on_data_table_row_selected(self, event):
+        if event.data_table.id == "dashboard_dt":
+            self.S_REPO = str(event.data_table.get_row(event.row_key)[0])
             self.post_message(Key("ctrl+o", "o"))
+        elif event.data_table.id in ("issues_dt", "pullrequests_dt"):
+            tab = event.data_table.id[:-3]
+            number = event.data_table.get_row(event.row_key)[0]
+            self.S_ITEM = (tab, self.S_ORG, self.S_REPO, number, 1)
+            self.show_detail()
+        elif event.data_table.id == "notifications_dt":
+            self.open_notification(event.cursor_row)
+
+    def open_notification(self, row):
+        store = self.STORES["notifications"][1]
+        owner, repo = store.value(row, "repo").split("/", 1)
+        tab = {
+            "Issue": "issues",
+            "PullRequest": "pullrequests",
+            "CheckSuite": "actions",
+            "WorkflowRun": "actions",
+        }.get(store.value(row, "type"), "overview")
+        number = store.value(row, "number")
+
+        if owner != self.S_ORG:
+            self.show_org(owner)
+        self.S_REPO = repo
+        record_access(self.S_ORG, self.S_REPO)
+        self.action_show_tab(tab)
+
+        # Put the cursor on the issue or pull request it was about
+        if tab in ("issues", "pullrequests") and number:
+            items = self.STORES[tab][1]
+            for i in range(len(items)):
+                if items.value(i, "number") == number:
+                    self.query_one(f"#{tab}_dt", DataTable).move_cursor(row=i)
+                    break
+
+    def on_data_table_header_selected(self, event):
+        tab = event.data_table.id[:-3]
+        if tab not in self.STORES:
+            return
+        store = self.STORES[tab][1]
+        column = store.column(event.column_index)
+        self.S_COL[tab] = column
+        store.sort(column, store.sort_key == column and not store.reverse)
+        self.refresh_table(tab)
+
+    def action_filter_column(self):
+        tab = self.get_child_by_type(TabbedContent).active
+        if tab not in self.STORES:
+            return
+        dt = self.query_one(f"#{tab}_dt", DataTable)
+        store = self.STORES[tab][1]
+        column = self.S_COL.get(tab, store.column(0))
+        if column in store.filters:
+            store.filter(column)
+        elif len(store):
+            store.filter(column, store.value(dt.cursor_row, column))
+        self.refresh_table(tab)
+
+    def action_group_column(self):
+        tab = self.get_child_by_type(TabbedContent).active
+        if tab not in self.STORES:
+            return
+        summary, store = self.STORES[tab]
+        column = self.S_COL.get(tab, store.column(0))
+        fmt = dict(store.display).get(column)
+        groups = "   ".join(
+            f"{fmt(k) if fmt and store.types[column] == 'enum' else k}[underline]:[/] {v}"
+            for k, v in store.group_by(column).items()
+        )
+        self.query_one(f"#{tab}_data", Label).update(
+            f"{summary}[bold]{column}[/] ▸ {groups}\n"
+        )
+
+    def refresh_table(self, tab):
+        summary, store = self.STORES[tab]
+        dt = self.query_one(f"#{tab}_dt", DataTable)
+        dt.clear()
+        dt.add_rows(store.rows())
+        filters = ", ".join(f"{k}={v}" for k, v in store.filters.items())
+        self.query_one(f"#{tab}_data", Label).update(
+            f"{summary}[dim]{filters}[/]\n" if filters else summary
+        )
+
+    def action_show_diff(self):
+        if self.get_child_by_type(TabbedContent).active != "pullrequests":
+            return
+        dt = self.query_one("#pullrequests_dt", DataTable)
+        if dt.row_count:
+            number = dt.get_row_at(dt.cursor_row)[0]
+            self.push_screen(DiffScreen(self.DP, self.S_ORG, self.S_REPO, number))
+
+    def action_more_comments(self):
+        item = getattr(self, "S_ITEM", None)
+        if item and self.get_child_by_type(TabbedContent).active == item[0]:
+            self.S_ITEM = (*item[:4], item[4] + 1)
+            self.show_detail()
+
+    def show_detail(self):
+        tab, org, repo, number, pages = self.S_ITEM
+        try:
+            d = self.DP.get_detail(org, repo, number, pages)
+        except ValueError as e:
+            self.notify(str(e), severity="error")
+            return
+        pane = self.query_one(f"#{tab}_dsc")
+        pane.query_one(f"#{tab}_detail_data", Label).update(d[0])
+        pane.query_one(f"#{tab}_detail", Label).update(d[1])
+        pane.display = True
 
     def render_tab(self, l1, l2, l3, l4, d):
         l1_q = self.query_one(*l1)
@@ -194,10 +476,18 @@ Text { width: auto; }
             l4_q.update(d[1])
         elif isinstance(l4_q, DataTable):
             l4_q.clear()
-            l4_q.add_rows(d[1])
+            if isinstance(d[1], RowStore):
+                self.STORES[l2[0][1:]] = d
+                l4_q.add_rows(d[1].rows())
+            else:
+                l4_q.add_rows(d[1])
+            # Any open detail pane belongs to the previous contents
+            for pane in l2_q.query(".detail"):
+                pane.display = False
+            self.S_ITEM = None
 
     def compose(self):
-        tabs = ["Overview", "Issues", "PullRequests", "Actions"]
+        tabs = self.TABS
         self.orgs_l = ListView(id="orgs")
         self.orgs_l.border_title = "Organizations"
         yield self.orgs_l
@@ -207,7 +497,7 @@ Text { width: auto; }
                 with TabPane(tab, id=tab.lower()):
                     yield Label(id=f"{tab.lower()}_data")
                     if tab.lower() == "overview":
-                        yield VerticalScroll(
+                        yield OverviewScroll(
                             Label(id=f"{tab.lower()}_md"), id=f"{tab.lower()}_sc"
                         )
                     else:
@@ -219,6 +509,13 @@ Text { width: auto; }
                             ),
                             id=f"{tab.lower()}_sc",
                         )
+                    if tab.lower() in ("issues", "pullrequests"):
+                        yield VerticalScroll(
+                            Label(id=f"{tab.lower()}_detail_data"),
+                            Label(id=f"{tab.lower()}_detail"),
+                            id=f"{tab.lower()}_dsc",
+                            classes="detail",
+                        )
 
         self.repos_l = ListView(id="repos")
         self.repos_l.border_title = "Repositories"
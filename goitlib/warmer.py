@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# stdlib imports
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# internal imports
+from . import ghcli
+
+usage_file = os.path.join(ghcli.cache_dir, "usage.json")
+usage_lock = threading.Lock()
+half_life = 60 * 60 * 24 * 7  # a visit counts half as much after a week
+
+# Cached wrapper methods backing each tab
+TAB_METHODS = {
+    "overview": ("get_overview", "get_repo_info"),
+    "issues": ("get_issues",),
+    "pullrequests": ("get_pull_requests",),
+    "actions": ("get_actions",),
+    "dashboard": ("search_issues", "search_pull_requests"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _load_usage():
+    try:
+        with open(usage_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_access(owner, repo=None, tab=None):
+    """
+    Note a visit to `owner/repo` (or to the org dashboard when repo is None),
+    and which tab was opened, so warm() knows what is worth refreshing.
+    """
+    key = f"{owner}/{repo or ''}"
+    with usage_lock:
+        usage = _load_usage()
+        u = usage.setdefault(key, {"visits": 0, "last": 0, "tabs": {}})
+        u["last"] = time.time()
+        if tab:
+            u["tabs"][tab] = u["tabs"].get(tab, 0) + 1
+        else:
+            u["visits"] += 1
+        with open(f"{usage_file}.tmp", "w") as f:
+            json.dump(usage, f)
+        os.replace(f"{usage_file}.tmp", usage_file)
+
+
+def top_repos(n=10):
+    """The `n` most used (owner, repo, usage) entries, by decayed visit count."""
+    now = time.time()
+    usage = _load_usage()
+    scored = sorted(
+        usage.items(),
+        key=lambda i: -(i[1]["visits"] + sum(i[1]["tabs"].values()))
+        * 0.5 ** ((now - i[1]["last"]) / half_life),
+    )
+    return [(*k.split("/", 1), u) for k, u in scored[:n]]
+
+
+def _stale(owner, repo, name, ahead):
+    path = ghcli.cache_file(owner, repo or "default", name)
+    if not os.path.exists(path):
+        return True
+    return time.time() - os.path.getmtime(path) > ghcli.cache_age - ahead
+
+
+def warm(gh, n=10, workers=4, ahead=None):
+    """
+    Refresh the cache entries behind the tabs used on the top `n` repos that
+    will expire within `ahead` seconds (half of cache_age by default), at
+    most `workers` at a time. Returns the list of (owner, repo, method) that
+    were refreshed.
+    """
+    ahead = ghcli.cache_age // 2 if ahead is None else ahead
+    jobs = []
+    for owner, repo, u in top_repos(n):
+        for tab in u["tabs"] or ("overview",):
+            for name in TAB_METHODS.get(tab, ()):
+                if _stale(owner, repo, name, ahead):
+                    jobs.append((owner, repo, name))
+
+    def refresh(job):
+        owner, repo, name = job
+        kwargs = {"owner": owner, "bypass_cache": True}
+        if repo:
+            kwargs["repo"] = repo
+        try:
+            # gh wrappers keep per call state, so each thread gets its own
+            getattr(copy.copy(gh), name)(**kwargs)
+            return job
+        except ValueError as e:
+            logger.warning("Warming %s/%s on %s failed: %s", owner, repo, name, e)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [job for job in pool.map(refresh, jobs) if job]
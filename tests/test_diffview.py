@@ -0,0 +1,45 @@
+from goitlib import diffview
+from goitlib.diffview import DiffIndex
+
+
+def make_index(lines):
+    index = DiffIndex()
+    for line in lines:
+        index.feed(line)
+    return index
+
+
+DIFF = [
+    "diff --git a/a.py b/a.py",  # 0
+    "--- a/a.py",
+    "+++ b/a.py",
+    "@@ -1,2 +1,2 @@",
+    "-x = 1",  # 4
+    "+x = 2",
+    "@@ -10,1 +10,1 @@",
+    " y = 3",  # 7
+    "diff --git a/b.c b/b.c",  # 8
+    "@@ -1 +1 @@",
+    "+int z;",  # 10
+]
+
+
+def test_headers_are_not_in_a_block():
+    index = make_index(DIFF)
+    for y in (0, 1, 2, 3, 6, 8, 9):
+        assert index.block_of(y) is None
+
+
+def test_blocks_stop_at_the_next_hunk_and_file():
+    index = make_index(DIFF)
+    assert index.block_of(5) == (4, 6, "a.py")
+    assert index.block_of(7) == (7, 8, "a.py")
+    assert index.block_of(10) == (10, 11, "b.c")
+
+
+def test_long_hunks_are_split_into_blocks(monkeypatch):
+    monkeypatch.setattr(diffview, "block_size", 4)
+    index = make_index(DIFF[:4] + [f"+{i}" for i in range(10)])
+    assert index.block_of(4) == (4, 8, "a.py")
+    assert index.block_of(9) == (8, 12, "a.py")
+    assert index.block_of(13) == (12, 14, "a.py")
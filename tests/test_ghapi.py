@@ -0,0 +1,168 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from goitlib import ghcli
+from goitlib.ghapi import GitHubAPIWrapper
+
+
+class MockGitHub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        self.server.requests.append((self.command, self.path, self.client_address))
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        port = self.server.server_port
+        if self.path.startswith("/api/search/issues"):
+            page = 2 if "page=2" in self.path else 1
+            item = {
+                "repository_url": f"http://x/repos/org/repo{page}",
+                "user": {"login": "someone"},
+                "created_at": "2024-01-01T00:00:00Z",
+                "updated_at": "2024-01-02T00:00:00Z",
+                "number": page,
+                "title": f"issue {page}",
+                "html_url": "http://x",
+            }
+            headers = {}
+            if page == 1:
+                headers["Link"] = (
+                    f'<http://127.0.0.1:{port}/api/search/issues?q=x&page=2>; rel="next"'
+                )
+            return self._send(200, {"items": [item]}, headers)
+        if self.path.startswith("/api/notifications"):
+            if self.headers.get("If-Modified-Since"):
+                return self._send(304, b"")
+            page = 2 if "page=2" in self.path else 1
+            headers = {"Last-Modified": "Tue, 01 Oct 2024 00:00:00 GMT"}
+            if page == 1:
+                headers["Link"] = (
+                    f'<http://127.0.0.1:{port}/api/notifications?per_page=50&page=2>; rel="next"'
+                )
+            return self._send(200, [{"id": str(page)}], headers)
+        if self.path == "/api/repos/org/repo/readme":
+            return self._send(404, {"message": "Not Found"})
+        if self.path == "/api/repos/org/repo":
+            return self._send(200, {"description": "a repo"})
+        if self.path == "/api/repos/org/repo/pulls/1":
+            return self._send(200, b"diff --git a/x b/x\n@@ -1 +1 @@\n-a\n+b\n")
+        if self.path == "/api/repos/org/repo/pulls/2":
+            # Promise more than we send, then hang up mid body
+            self.server.requests.append((self.command, self.path, self.client_address))
+            self.send_response(200)
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            self.wfile.write(b"diff --git a/x b/x\n")
+            self.close_connection = True
+            return
+        return self._send(500, {"message": "boom"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._send(200, {"data": {"repository": {"name": "repo"}}})
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), MockGitHub)
+    srv.requests = []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def gh(server, tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    monkeypatch.setattr(ghcli, "cache_dir", str(tmp_path))
+    return GitHubAPIWrapper(f"http://127.0.0.1:{server.server_port}/api", token="t")
+
+
+def test_search_follows_pagination(gh, server):
+    data = json.loads(gh.search_issues(owner="org"))
+    assert [d["number"] for d in data] == [1, 2]
+    assert data[1]["repository"] == {"name": "repo2", "nameWithOwner": "org/repo2"}
+    assert len(server.requests) == 2
+
+
+def test_missing_readme_is_not_an_error(gh):
+    out = gh.get_overview(owner="org", repo="repo")
+    assert out == "name:\torg/repo\ndescription:\ta repo\n--\n"
+
+
+def test_connections_are_reused(gh, server):
+    gh.get_overview(owner="org", repo="repo")
+    gh.get_repo_info(owner="org", repo="repo")
+    assert len(server.requests) == 3
+    assert len({r[2] for r in server.requests}) == 1
+
+
+def test_http_errors_raise_valueerror(gh):
+    with pytest.raises(ValueError, match="status 500"):
+        gh.get_actions(owner="org", repo="repo")
+
+
+def test_connection_errors_raise_valueerror(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    monkeypatch.setattr(ghcli, "cache_dir", str(tmp_path))
+    # Grab a free port and close it again so nothing is listening there
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    gh = GitHubAPIWrapper(f"http://127.0.0.1:{port}", token="t")
+    with pytest.raises(ValueError, match="ConnectionRefusedError"):
+        gh.get_repo_info(owner="org", repo="repo")
+
+
+def test_stream_diff_leaves_a_reusable_connection(gh, server):
+    lines = list(gh.stream_diff(owner="org", repo="repo", number=1))
+    assert lines == ["diff --git a/x b/x", "@@ -1 +1 @@", "-a", "+b"]
+    gh.get_repo_info(owner="org", repo="repo")
+    # One GET for the diff and exactly one POST, on the same socket
+    assert [r[0] for r in server.requests] == ["GET", "POST"]
+    assert len({r[2] for r in server.requests}) == 1
+
+
+def test_stream_diff_cut_short_raises_valueerror(gh):
+    lines = gh.stream_diff(owner="org", repo="repo", number=2)
+    assert next(lines) == "diff --git a/x b/x"
+    with pytest.raises(ValueError, match="IncompleteRead"):
+        list(lines)
+
+
+def test_retry_skips_other_stale_connections(gh, server):
+    # Fill the pool with connections the server has since dropped
+    for _ in range(2):
+        conn = gh._connect(fresh=True)
+        conn.connect()
+        conn.sock.close()
+        gh._release(conn)
+    out = gh.get_overview(owner="org", repo="repo")
+    assert out == "name:\torg/repo\ndescription:\ta repo\n--\n"
+
+
+def test_notifications_follow_pagination(gh, server):
+    status, headers, body = gh.poll_notifications()
+    assert status == 200
+    assert [n["id"] for n in json.loads(body)] == ["1", "2"]
+    # Unchanged inboxes cost a single conditional request
+    status, _, body = gh.poll_notifications(headers["last-modified"])
+    assert (status, body) == (304, "")
+    assert len(server.requests) == 3
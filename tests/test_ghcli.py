@@ -0,0 +1,49 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from goitlib import ghcli
+
+calls = []
+
+
+@ghcli.cache_results(keys=("number",))
+def get_item(owner, repo, number):
+    calls.append(number)
+    return {"number": number, "fetch": len(calls)}
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    monkeypatch.setattr(ghcli, "cache_dir", str(tmp_path))
+    calls.clear()
+
+
+def age(path, iso):
+    t = datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp()
+    os.utime(path, (t, t))
+
+
+def test_cache_hit_while_item_unchanged():
+    get_item(owner="o", repo="r", number=1, updated_at="2024-01-01T00:00:00Z")
+    out = get_item(owner="o", repo="r", number=1, updated_at="2024-01-01T00:00:00Z")
+    assert out == {"number": 1, "fetch": 1}
+
+
+def test_newer_updated_at_forces_refetch():
+    get_item(owner="o", repo="r", number=1)
+    age(ghcli.cache_file("o", "r", "get_item", "_-_1"), "2024-01-01T00:00:00")
+    out = get_item(owner="o", repo="r", number=1, updated_at="2024-01-02T00:00:00Z")
+    assert out == {"number": 1, "fetch": 2}
+    # The refetch left a fresh entry behind
+    out = get_item(owner="o", repo="r", number=1, updated_at="2024-01-02T00:00:00Z")
+    assert out == {"number": 1, "fetch": 2}
+
+
+def test_entries_are_kept_per_item():
+    get_item(owner="o", repo="r", number=1)
+    get_item(owner="o", repo="r", number=2)
+    get_item(owner="o", repo="r", number=1)
+    assert calls == [1, 2]
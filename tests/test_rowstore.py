@@ -0,0 +1,47 @@
+from goitlib.rowstore import RowStore
+
+
+def make_store():
+    store = RowStore(
+        (("number", "int"), ("state", "enum"), ("createdAt", "time")),
+        (("number", None), ("state", None)),
+    )
+    store.append(number=3, state="OPEN", createdAt="2024-01-02T10:00:00Z")
+    store.append(number=None, state="CLOSED", createdAt="2024-01-02T18:00:00Z")
+    store.append(number=1, state="OPEN", createdAt=None)
+    store.append(number=2, state="OPEN", createdAt="2024-01-01T00:00:00Z")
+    return store
+
+
+def test_sort_puts_missing_values_last():
+    store = make_store()
+    store.sort("number")
+    assert [n for n, _ in store.rows()] == [1, 2, 3, None]
+    store.sort("number", reverse=True)
+    assert [n for n, _ in store.rows()] == [3, 2, 1, None]
+
+
+def test_filter_and_clear():
+    store = make_store()
+    store.filter("state", "OPEN")
+    assert len(store) == 3
+    assert store.value(0, "number") == 3
+    store.filter("state")
+    assert len(store) == 4
+
+
+def test_filter_keeps_sort_order():
+    store = make_store()
+    store.sort("number", reverse=True)
+    store.filter("state", "OPEN")
+    assert [n for n, _ in store.rows()] == [3, 2, 1]
+
+
+def test_group_by_time_groups_days():
+    store = make_store()
+    groups = store.group_by("createdAt")
+    assert [(str(k), v) for k, v in groups.items()] == [
+        ("2024-01-02", 2),
+        ("None", 1),
+        ("2024-01-01", 1),
+    ]